@@ -0,0 +1,103 @@
+import asyncio
+import os
+from typing import List, Optional
+import orjson
+from aiohttp import web
+
+from .vlm_processor import LayoutLMModel, decode_page
+from .utils.batching import collect_batch
+
+class LayoutLMServer:
+    """Hosts one LayoutLMv3 model for all API workers and batches their requests"""
+    def __init__(self, max_batch: int = 16, max_wait_ms: int = 20, device: Optional[str] = None):
+        self.model = LayoutLMModel(device)
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_worker: Optional[asyncio.Task] = None
+    
+    async def start(self, app: web.Application):
+        """Load the model and start the batch worker"""
+        await asyncio.get_running_loop().run_in_executor(self.model.executor, self.model.load)
+        self._queue = asyncio.Queue()
+        self._batch_worker = asyncio.create_task(self._batch_loop())
+        print("LayoutLMv3 server initialized successfully")
+    
+    async def stop(self, app: web.Application):
+        """Stop the batch worker and the model thread"""
+        if self._batch_worker is not None:
+            self._batch_worker.cancel()
+            try:
+                await self._batch_worker
+            except asyncio.CancelledError:
+                pass
+            self._batch_worker = None
+            
+            # Pages still queued will never be scored
+            while not self._queue.empty():
+                *_, future = self._queue.get_nowait()
+                self._fail_pending([future], Exception("LayoutLMv3 server stopped"))
+        self.model.executor.shutdown(wait=False)
+    
+    async def predict(self, request: web.Request) -> web.Response:
+        """Queue one page for the next batch and return its prediction"""
+        if self._batch_worker is None:
+            raise web.HTTPServiceUnavailable(text="LayoutLMv3 server stopped")
+        
+        body = orjson.loads(await request.read())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((decode_page(body["image"]), body["words"], body["boxes"], future))
+        
+        try:
+            result = await future
+        except Exception as e:
+            raise web.HTTPServiceUnavailable(text=str(e))
+        return web.Response(body=orjson.dumps(result), content_type="application/json")
+    
+    async def _batch_loop(self):
+        """Coalesce pages arriving within max_wait_ms into batches of up to max_batch"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                await collect_batch(self._queue, batch, self.max_batch, self.max_wait_ms)
+            except asyncio.CancelledError:
+                # Stopped while collecting; the pages taken so far would otherwise hang
+                self._fail_pending([future for *_, future in batch], Exception("LayoutLMv3 server stopped"))
+                raise
+            
+            # One forward pass per batch; pages arriving meanwhile form the next one
+            images, words, boxes, futures = zip(*batch)
+            try:
+                results = await loop.run_in_executor(
+                    self.model.executor, self.model.predict_batch, list(images), list(words), list(boxes)
+                )
+            except asyncio.CancelledError:
+                self._fail_pending(futures, Exception("LayoutLMv3 server stopped"))
+                raise
+            except Exception as e:
+                # Fail this batch only; the loop keeps serving later requests
+                self._fail_pending(futures, e)
+                continue
+            
+            for future, result in zip(futures, results):
+                if not future.done():  # Client went away
+                    future.set_result(result)
+    
+    def _fail_pending(self, futures: List[asyncio.Future], error: Exception):
+        """Fail futures of pages that will not get a prediction"""
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+def create_app() -> web.Application:
+    server = LayoutLMServer(device=os.getenv("LAYOUTLM_DEVICE"))
+    app = web.Application()
+    app.router.add_post("/predict", server.predict)
+    app.on_startup.append(server.start)
+    # on_shutdown runs before aiohttp waits for open handlers, so pending pages fail promptly
+    app.on_shutdown.append(server.stop)
+    return app
+
+if __name__ == "__main__":
+    web.run_app(create_app(), path=os.getenv("LAYOUTLM_SOCKET", "/tmp/layoutlm.sock"))
@@ -1,35 +1,98 @@
 import asyncio
-import json
-from typing import Dict, List, Any
-import requests
+import orjson
+from typing import Dict, List, Any, Optional, Set, Tuple
+import aiohttp
 import re
+from cachetools import LRUCache
+
+from .utils.batching import collect_batch
+
+# Section patterns used to parse the LLM response
+_SECTION_RES = {
+    name: re.compile(f"{name}:(.+?)(?=RISKS:|COMPLETENESS:|SUMMARY:|$)", re.DOTALL | re.IGNORECASE)
+    for name in ("BENEFITS", "RISKS", "COMPLETENESS", "SUMMARY")
+}
+_PCT_RE = re.compile(r"(\d+)%")
 
 class LLMReasoner:
     def __init__(self):
         self.ollama_url = "http://localhost:11434/api/generate"
         self.model_name = "llama3.2:3b"
         self.ready = False
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # Micro-batching of concurrent prompts
+        self.max_batch = 16
+        self.max_wait_ms = 20
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_worker: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        
+        # Analyses keyed by "<file sha256>:<document type>"
+        self._cache: LRUCache = LRUCache(maxsize=1024)
     
     async def initialize(self):
         """Initialize connection to Ollama"""
         try:
+            # Pooled session shared by all requests to Ollama
+            if self._session is None:
+                connector = aiohttp.TCPConnector(limit=64, keepalive_timeout=60)
+                # Fail fast if Ollama is unreachable, but allow long generations
+                timeout = aiohttp.ClientTimeout(total=300, sock_connect=3)
+                self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            
+            # Start the batch worker that feeds prompts to Ollama
+            if self._batch_worker is None:
+                self._queue = asyncio.Queue()
+                self._batch_worker = asyncio.create_task(self._batch_loop())
+            
             # Test connection
-            response = requests.get("http://localhost:11434/api/tags")
-            if response.status_code == 200:
-                self.ready = True
-                print("LLM Reasoner initialized successfully")
-            else:
-                print("Ollama service not available")
-                self.ready = False
+            async with self._session.get("http://localhost:11434/api/tags") as response:
+                if response.status == 200:
+                    self.ready = True
+                    print("LLM Reasoner initialized successfully")
+                else:
+                    print("Ollama service not available")
+                    self.ready = False
         except Exception as e:
             print(f"Error initializing LLM: {e}")
             self.ready = False
     
+    async def close(self):
+        """Stop the batch worker and close the HTTP session to Ollama"""
+        if self._batch_worker is not None:
+            self._batch_worker.cancel()
+            try:
+                await self._batch_worker
+            except asyncio.CancelledError:
+                pass
+            self._batch_worker = None
+            
+            # Prompts still queued will never be dispatched
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                self._fail_pending([future])
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self.ready = False
+    
     def is_ready(self) -> bool:
         return self.ready
     
-    async def analyze_document(self, extracted_data: Dict[str, Any], document_type: str) -> Dict[str, Any]:
-        """Analyze document and return structured assessment"""
+    async def analyze_document(
+        self,
+        extracted_data: Dict[str, Any],
+        document_type: str,
+        digest: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Analyze document and return structured assessment, cached by file digest if given"""
+        cache_key = f"{digest}:{document_type}" if digest else None
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        
         try:
             # Create analysis prompt
             prompt = self._create_analysis_prompt(extracted_data, document_type)
@@ -40,6 +103,9 @@ class LLMReasoner:
             # Parse and structure response
             analysis = self._parse_llm_response(llm_response, document_type, extracted_data)
             
+            if cache_key:
+                self._cache[cache_key] = analysis
+            
             return analysis
             
         except Exception as e:
@@ -52,9 +118,9 @@ class LLMReasoner:
         
         Document Text: {extracted_data.get('raw_text', '')}
         
-        Extracted Fields: {json.dumps(extracted_data.get('extracted_fields', {}), indent=2)}
+        Extracted Fields: {orjson.dumps(extracted_data.get('extracted_fields', {}), option=orjson.OPT_INDENT_2).decode()}
         
-        Layout Analysis: {json.dumps(extracted_data.get('layout_data', {}), indent=2)}
+        Layout Analysis: {orjson.dumps(extracted_data.get('layout_data', {}), option=orjson.OPT_INDENT_2).decode()}
         
         Please provide analysis in the following format:
         """
@@ -105,6 +171,52 @@ class LLMReasoner:
         return prompt
     
     async def _query_ollama(self, prompt: str) -> str:
+        """Queue prompt for the batch worker and wait for its response"""
+        if self._batch_worker is None:
+            return await self._generate(prompt)
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, future))
+        return await future
+    
+    async def _batch_loop(self):
+        """Coalesce prompts arriving within max_wait_ms into batches of up to max_batch"""
+        while True:
+            batch = []
+            try:
+                await collect_batch(self._queue, batch, self.max_batch, self.max_wait_ms)
+            except asyncio.CancelledError:
+                # Closed while collecting; the prompts taken so far would otherwise hang
+                self._fail_pending([future for _, future in batch])
+                raise
+            
+            # Dispatch without waiting so the next batch can start collecting
+            task = asyncio.create_task(self._dispatch_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+    
+    def _fail_pending(self, futures: List[asyncio.Future]):
+        """Fail futures whose prompts will never be sent because the reasoner is closing"""
+        for future in futures:
+            if not future.done():
+                future.set_exception(Exception("LLM reasoner closed"))
+    
+    async def _dispatch_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Send a batch of prompts together; Ollama batches them once the model is loaded"""
+        results = await asyncio.gather(
+            *(self._generate(prompt) for prompt, _ in batch),
+            return_exceptions=True
+        )
+        
+        for (_, future), result in zip(batch, results):
+            if future.done():  # Caller went away
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    
+    async def _generate(self, prompt: str) -> str:
         """Query Ollama API"""
         try:
             payload = {
@@ -113,10 +225,11 @@ class LLMReasoner:
                 "stream": False
             }
             
-            response = requests.post(self.ollama_url, json=payload)
-            response.raise_for_status()
+            async with self._session.post(self.ollama_url, json=payload) as response:
+                response.raise_for_status()
+                data = orjson.loads(await response.read())
             
-            return response.json()["response"]
+            return data["response"]
             
         except Exception as e:
             raise Exception(f"Ollama query error: {str(e)}")
@@ -146,8 +259,7 @@ class LLMReasoner:
     
     def _extract_section(self, response: str, section_name: str) -> List[str]:
         """Extract specific section from LLM response"""
-        pattern = f"{section_name}:(.+?)(?=RISKS:|COMPLETENESS:|SUMMARY:|$)"
-        match = re.search(pattern, response, re.DOTALL | re.IGNORECASE)
+        match = _SECTION_RES[section_name].search(response)
         
         if match:
             content = match.group(1).strip()
@@ -159,11 +271,10 @@ class LLMReasoner:
     
     def _extract_completeness(self, response: str) -> float:
         """Extract completeness percentage from response"""
-        pattern = r"(\d+)%"
-        matches = re.findall(pattern, response)
+        match = _PCT_RE.search(response)
         
-        if matches:
-            return float(matches[0])
+        if match:
+            return float(match.group(1))
         
         return 75.0  # Default value
     
@@ -2,29 +2,47 @@ from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
+import orjson
 import os
 from typing import Dict, Any
-import json
-from datetime import datetime
+from datetime import datetime, timezone
 
 from .vlm_processor import VLMProcessor
 from .llm_reasoner import LLMReasoner
 from .models.document_schemas import DocumentAnalysis
 from .utils.file_handler import FileHandler
 
-app = FastAPI(title="Property Document Verifier", version="1.0.0")
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson"""
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=str)
 
-# Configure CORS
+app = FastAPI(
+    title="Property Document Verifier",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
+
+# Configure CORS for the known frontend origins only
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:8501").split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
 
 # Initialize processors
-vlm_processor = VLMProcessor()
+vlm_processor = VLMProcessor(
+    enable_layoutlm=os.getenv("ENABLE_LAYOUTLM", "false").lower() == "true",
+    layoutlm_socket=os.getenv("LAYOUTLM_SOCKET"),
+    layoutlm_device=os.getenv("LAYOUTLM_DEVICE")
+)
 llm_reasoner = LLMReasoner()
 file_handler = FileHandler()
 
@@ -35,6 +53,12 @@ async def startup_event():
     await llm_reasoner.initialize()
     os.makedirs("uploads", exist_ok=True)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release connections on shutdown"""
+    await llm_reasoner.close()
+    await vlm_processor.close()
+
 @app.get("/")
 async def root():
     return {"message": "Property Document Verifier API", "status": "running"}
@@ -53,24 +77,24 @@ async def upload_document(
             raise HTTPException(status_code=400, detail="Invalid file type")
         
         # Save uploaded file
-        file_path = await file_handler.save_file(file, document_type)
+        file_path, digest = await file_handler.save_file(file, document_type)
         
         # Process with VLM
-        extracted_data = await vlm_processor.extract_document_data(file_path, document_type)
+        extracted_data = await vlm_processor.extract_document_data(file_path, document_type, digest)
         
         # Analyze with LLM
-        analysis_result = await llm_reasoner.analyze_document(extracted_data, document_type)
+        analysis_result = await llm_reasoner.analyze_document(extracted_data, document_type, digest)
         
         # Create response
         response = {
             "documentType": document_type,
             "filename": file.filename,
-            "uploadTime": datetime.now().isoformat(),
+            "uploadTime": datetime.now(timezone.utc).isoformat(),
             "analysis": analysis_result,
             "status": "success"
         }
         
-        return JSONResponse(content=response)
+        return response
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
@@ -94,4 +118,13 @@ async def health_check():
     }
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        # Few workers: each has its own caches and batch queues, so more workers
+        # mean lower cache hit rates and smaller Ollama batches
+        workers=int(os.getenv("WEB_CONCURRENCY", 2)),
+        loop="uvloop",
+        http="httptools"
+    )
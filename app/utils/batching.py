@@ -0,0 +1,28 @@
+import asyncio
+from typing import List
+
+async def collect_batch(queue: asyncio.Queue, batch: List, max_batch: int, max_wait_ms: int):
+    """Wait for one item, then add items arriving within max_wait_ms to batch, up to max_batch"""
+    # batch is filled in place so a cancelled caller still sees the items taken off the queue
+    loop = asyncio.get_running_loop()
+    batch.append(await queue.get())
+    deadline = loop.time() + max_wait_ms / 1000
+
+    while len(batch) < max_batch:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        # asyncio.wait rather than wait_for: before Python 3.12, wait_for can swallow a
+        # cancellation that arrives together with an item, leaving the worker running
+        getter = asyncio.ensure_future(queue.get())
+        try:
+            await asyncio.wait((getter,), timeout=timeout)
+        finally:
+            # Keep an item the getter already took, even when we are being cancelled
+            got = getter.done()
+            if got:
+                batch.append(getter.result())
+            else:
+                getter.cancel()
+        if not got:
+            break
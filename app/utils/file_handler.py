@@ -1,14 +1,27 @@
 import os
 import uuid
+import hashlib
+import aiofiles
+import aiofiles.os
 from fastapi import UploadFile
-from typing import List
-import shutil
+from typing import List, Tuple
 
 class FileHandler:
     def __init__(self):
         self.upload_dir = "uploads"
         self.allowed_extensions = {'.pdf', '.jpg', '.jpeg', '.png'}
-        os.makedirs(self.upload_dir, exist_ok=True)
+        self.document_types = ("Rent Agreement", "Title Deed", "NOC")
+        
+        # Create per-type directories once so uploads don't hit makedirs
+        self._doc_dirs = set()
+        for document_type in self.document_types:
+            doc_dir = self._doc_dir(document_type)
+            os.makedirs(doc_dir, exist_ok=True)
+            self._doc_dirs.add(doc_dir)
+    
+    def _doc_dir(self, document_type: str) -> str:
+        """Directory holding uploads of the given document type"""
+        return os.path.join(self.upload_dir, document_type.replace(" ", "_"))
     
     def is_valid_file(self, filename: str) -> bool:
         """Check if file extension is allowed"""
@@ -16,34 +29,42 @@ class FileHandler:
             return False
         return any(filename.lower().endswith(ext) for ext in self.allowed_extensions)
     
-    async def save_file(self, file: UploadFile, document_type: str) -> str:
-        """Save uploaded file and return path"""
+    async def save_file(self, file: UploadFile, document_type: str) -> Tuple[str, str]:
+        """Save uploaded file and return its path and SHA-256 digest"""
         try:
             # Generate unique filename
             file_extension = os.path.splitext(file.filename)[1]
             unique_filename = f"{uuid.uuid4()}{file_extension}"
             
-            # Create document type directory
-            doc_dir = os.path.join(self.upload_dir, document_type.replace(" ", "_"))
-            os.makedirs(doc_dir, exist_ok=True)
+            # Create directory only for document types not seen before
+            doc_dir = self._doc_dir(document_type)
+            if doc_dir not in self._doc_dirs:
+                await aiofiles.os.makedirs(doc_dir, exist_ok=True)
+                self._doc_dirs.add(doc_dir)
             
             # Save file
             file_path = os.path.join(doc_dir, unique_filename)
             
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            # Stream in 1 MiB chunks so the event loop stays responsive,
+            # hashing as we go to key the processing caches
+            digest = hashlib.sha256()
+            async with aiofiles.open(file_path, "wb") as buffer:
+                while chunk := await file.read(1 << 20):
+                    digest.update(chunk)
+                    await buffer.write(chunk)
             
-            return file_path
+            return file_path, digest.hexdigest()
             
         except Exception as e:
             raise Exception(f"File save error: {str(e)}")
     
-    def get_file_info(self, file_path: str) -> dict:
+    async def get_file_info(self, file_path: str) -> dict:
         """Get file information"""
-        if not os.path.exists(file_path):
+        try:
+            stat = await aiofiles.os.stat(file_path)
+        except FileNotFoundError:
             return None
         
-        stat = os.stat(file_path)
         return {
             "size": stat.st_size,
             "modified": stat.st_mtime,
@@ -1,59 +1,225 @@
+import os
+import base64
+import functools
+import aiohttp
+import orjson
 import torch
 from transformers import LayoutLMv3Processor, LayoutLMv3ForTokenClassification
 from PIL import Image
 import pdf2image
-import pytesseract
+from rapidocr_onnxruntime import RapidOCR
 import cv2
 import numpy as np
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import re
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import LRUCache
 
-class VLMProcessor:
-    def __init__(self):
+# Field extraction patterns, compiled once at import
+_RENT_PARTIES_RE = re.compile(
+    r"""between\s+([A-Za-z\s,]+),\s+herein called\s+[“"'`]?Landlord[”"'`]?,?.*?and\s+([A-Za-z\s,]+),\s+herein called\s+[“"'`]?Tenant[”"'`]?""",
+    re.IGNORECASE | re.DOTALL
+)
+# Address and term spans can contain other fields' text, and finditer matches
+# never overlap, so these two keep their own searches
+_RENT_ADDR_RE = re.compile(r'located at ([0-9A-Za-z\s,]+) under the following', re.IGNORECASE)
+_RENT_TERM_RE = re.compile(r'fixed term of ([a-zA-Z0-9\s]+),', re.IGNORECASE)
+# Compact rent fields share one alternation so the text is scanned once
+_RENT_FIELDS_RE = re.compile(
+    r'sum of \$(?P<rent_amount>[0-9,]+) per month'
+    r'|security deposit of \$(?P<security_deposit>[0-9,]+)'
+    r'|payable monthly in advance on the (?P<rent_due_date>[0-9A-Za-z]+ day) of each month',
+    re.IGNORECASE
+)
+_RENT_MONEY_FIELDS = ("rent_amount", "security_deposit")
+_TITLE_OWNER_RE = re.compile(r"(?:owner|proprietor)[:\s]+([A-Za-z\s]+)", re.IGNORECASE)
+_TITLE_PROP_RE = re.compile(r"(?:property|plot)[:\s]+([A-Za-z0-9\s,.-]+)", re.IGNORECASE)
+_NOC_APPLICANT_RE = re.compile(r"(?:applicant|name)[:\s]+([A-Za-z\s]+)", re.IGNORECASE)
+_NOC_PURPOSE_RE = re.compile(r"(?:purpose|reason)[:\s]+([A-Za-z\s]+)", re.IGNORECASE)
+
+# Layout detection runs on a downsampled page; thresholds are scaled to match
+_LAYOUT_SCALE = 0.25
+_SIGNATURE_MIN_AREA = 30  # ~500 px² at full resolution
+_STAMP_MIN_PIXELS = 60  # ~1000 px at full resolution
+
+# LayoutLMv3's image processor resizes every page to this size
+LAYOUTLM_IMAGE_SIZE = (224, 224)
+
+def encode_page(image: Image.Image) -> str:
+    """Shrink a page to the LayoutLMv3 input size and serialize its pixels"""
+    page = image.convert("RGB").resize(LAYOUTLM_IMAGE_SIZE, Image.BILINEAR)
+    return base64.b64encode(page.tobytes()).decode()
+
+def decode_page(data: str) -> Image.Image:
+    """Inverse of encode_page"""
+    return Image.frombytes("RGB", LAYOUTLM_IMAGE_SIZE, base64.b64decode(data))
+
+class LayoutLMModel:
+    """LayoutLMv3 token classifier, run in-process or behind layoutlm_server"""
+    def __init__(self, device: Optional[str] = None):
         self.processor = None
         self.model = None
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.compiled = False
+        # Device is chosen explicitly (e.g. "cuda:1"); defaults to the first GPU if any
+        if device:
+            self.device = torch.device(device)
+        else:
+            self.device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        # fp16 weights on GPU; on CPU keep fp32 weights and autocast matmuls to bf16
+        self.model_dtype = torch.float16 if self.device.type == "cuda" else torch.float32
+        self.autocast_dtype = torch.float16 if self.device.type == "cuda" else torch.bfloat16
+        # CUDA graphs are recorded per thread, so load, warmup and every forward pass
+        # run on this one thread; it also keeps calls from entering the model concurrently
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="layoutlm")
+    
+    def load(self):
+        """Load, compile and warm up LayoutLMv3"""
+        # Words and boxes come from our own OCR pass, not the processor's Tesseract
+        self.processor = LayoutLMv3Processor.from_pretrained("microsoft/layoutlmv3-base", apply_ocr=False)
+        self.model = LayoutLMv3ForTokenClassification.from_pretrained("microsoft/layoutlmv3-base")
+        self.model = self.model.to(self.device, dtype=self.model_dtype).eval()
+        
+        # Fuse kernels and pay the compilation cost at startup, not on the first upload
+        self.model = torch.compile(self.model, mode="reduce-overhead", fullgraph=False)
+        self.compiled = True
+        warmup = self.predict(Image.new("RGB", LAYOUTLM_IMAGE_SIZE, "white"), ["warmup"], [[0, 0, 0, 0]])
+        if "error" in warmup:
+            print(f"LayoutLMv3 compilation failed, using eager model: {warmup['error']}")
+            self.model = self.model._orig_mod
+            self.compiled = False
+    
+    def predict(self, image: Image.Image, words: List[str], boxes: List[List[int]]) -> Dict[str, Any]:
+        """Run LayoutLMv3 on a single page"""
+        return self.predict_batch([image], [words], [boxes])[0]
+    
+    def predict_batch(
+        self,
+        images: List[Image.Image],
+        words: List[List[str]],
+        boxes: List[List[List[int]]]
+    ) -> List[Dict[str, Any]]:
+        """Run LayoutLMv3 on a batch of pages in a single forward pass, each truncated to 512 tokens."""
+        try:
+            # Fixed-length input keeps the compiled graph from recompiling per document;
+            # the eager model only pads to the longest page in the batch
+            encoding = self.processor(
+                images, words, boxes=boxes, return_tensors="pt", truncation=True,
+                padding="max_length" if self.compiled else True, max_length=512
+            )
+            encoding = {k: v.to(self.device) for k, v in encoding.items()}
+            encoding["pixel_values"] = encoding["pixel_values"].to(self.model_dtype)
+            with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=self.autocast_dtype):
+                outputs = self.model(**encoding)
+            
+            # Average the top label probability over real (non-padding) tokens
+            confidences = torch.nn.functional.softmax(outputs.logits.float(), dim=-1).max(dim=-1).values
+            mask = encoding["attention_mask"].bool()
+            return [
+                {
+                    "confidence_scores": confidences[i][mask[i]].mean().item(),
+                    "token_predictions": int(mask[i].sum())
+                }
+                for i in range(len(images))
+            ]
+        except Exception as e:
+            return [{"error": str(e)} for _ in images]
+
+class VLMProcessor:
+    def __init__(
+        self,
+        enable_layoutlm: bool = False,
+        layoutlm_socket: Optional[str] = None,
+        layoutlm_device: Optional[str] = None
+    ):
+        # LayoutLMv3 output isn't used by field extraction or the LLM, so it's opt-in
+        self.enable_layoutlm = enable_layoutlm
+        # Unix socket of a shared layoutlm_server; the model is loaded in-process if unset
+        self.layoutlm_socket = layoutlm_socket
+        self.layoutlm_device = layoutlm_device
+        self.ocr = None
+        self.layoutlm: Optional[LayoutLMModel] = None
+        self._layoutlm_session: Optional[aiohttp.ClientSession] = None
         self.ready = False
+        
+        # Extraction results keyed by "<file sha256>:<document type>"
+        self._cache: LRUCache = LRUCache(maxsize=1024)
     
     async def initialize(self):
-        """Initialize LayoutLMv3 model"""
+        """Initialize OCR engine and, if enabled, LayoutLMv3"""
         try:
-            self.processor = LayoutLMv3Processor.from_pretrained("microsoft/layoutlmv3-base")
-            self.model = LayoutLMv3ForTokenClassification.from_pretrained("microsoft/layoutlmv3-base")
-            self.model.to(self.device)
+            self.ocr = RapidOCR()
+            if self.enable_layoutlm:
+                if self.layoutlm_socket:
+                    connector = aiohttp.UnixConnector(path=self.layoutlm_socket)
+                    self._layoutlm_session = aiohttp.ClientSession(connector=connector)
+                else:
+                    self.layoutlm = LayoutLMModel(self.layoutlm_device)
+                    await asyncio.get_running_loop().run_in_executor(self.layoutlm.executor, self.layoutlm.load)
             self.ready = True
             print("VLM Processor initialized successfully")
         except Exception as e:
             print(f"Error initializing VLM: {e}")
             self.ready = False
     
+    async def close(self):
+        """Close the connection to the LayoutLMv3 server or stop the in-process model thread"""
+        if self._layoutlm_session is not None:
+            await self._layoutlm_session.close()
+            self._layoutlm_session = None
+        if self.layoutlm is not None:
+            self.layoutlm.executor.shutdown(wait=False)
+    
     def is_ready(self) -> bool:
         return self.ready
     
-    async def extract_document_data(self, file_path: str, document_type: str) -> Dict[str, Any]:
-        """Extract structured data from document"""
+    async def extract_document_data(
+        self,
+        file_path: str,
+        document_type: str,
+        digest: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Extract structured data from document, cached by file digest if given"""
+        cache_key = f"{digest}:{document_type}" if digest else None
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        
         try:
-            # Convert PDF to image if needed
+            loop = asyncio.get_running_loop()
+            
+            # Convert PDF pages to images if needed
             if file_path.lower().endswith('.pdf'):
-                images = pdf2image.convert_from_path(file_path)
-                image = images[0]  # Process first page
+                images = await loop.run_in_executor(
+                    None,
+                    functools.partial(pdf2image.convert_from_path, file_path, thread_count=os.cpu_count() or 1)
+                )
             else:
                 image = Image.open(file_path)
+                image.load()  # Decode once before sharing across worker threads
+                images = [image]
             
-            # Extract text using OCR
-            text = pytesseract.image_to_string(image)
+            # Pages are independent; process them concurrently
+            pages = await asyncio.gather(*(self._process_page(image) for image in images))
             
-            # Extract layout information
-            layout_data = self._extract_layout_features(image)
+            if self.enable_layoutlm:
+                structured_data = await self._process_with_layoutlm(
+                    images, [page["words"] for page in pages], [page["boxes"] for page in pages]
+                )
+            else:
+                structured_data = [{} for _ in pages]
             
-            # Process with LayoutLMv3
-            structured_data = await self._process_with_layoutlm(image, text)
+            text = "\n".join(page["raw_text"] for page in pages)
+            layout_data = {
+                "signature_detected": any(page["layout_data"]["signature_detected"] for page in pages),
+                "stamp_detected": any(page["layout_data"]["stamp_detected"] for page in pages),
+                "image_dimensions": pages[0]["layout_data"]["image_dimensions"],
+                "page_count": len(pages)
+            }
             
-            # Extract document-specific fields
+            # Extract document-specific fields across all pages
             extracted_fields = self._extract_document_fields(text, document_type)
             
-            return {
+            result = {
                 "raw_text": text,
                 "layout_data": layout_data,
                 "structured_data": structured_data,
@@ -61,26 +227,77 @@ class VLMProcessor:
                 "document_type": document_type
             }
             
+            # Don't let a transient LayoutLMv3 failure stick to this document
+            if cache_key and not any("error" in data for data in structured_data):
+                self._cache[cache_key] = result
+            
+            return result
+            
         except Exception as e:
             raise Exception(f"VLM processing error: {str(e)}")
     
+    async def _process_page(self, image: Image.Image) -> Dict[str, Any]:
+        """Run OCR and layout analysis on a single page"""
+        # OCR and layout analysis are independent; run them side by side
+        loop = asyncio.get_running_loop()
+        ocr, layout_data = await asyncio.gather(
+            loop.run_in_executor(None, self._run_ocr, image),
+            loop.run_in_executor(None, self._extract_layout_features, image)
+        )
+        
+        return {
+            "raw_text": ocr["text"],
+            "layout_data": layout_data,
+            "words": ocr["words"],
+            "boxes": ocr["boxes"]
+        }
+    
+    def _run_ocr(self, image: Image.Image) -> Dict[str, Any]:
+        """Recognize text lines and their boxes in-process with RapidOCR"""
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        # RapidOCR treats ndarray input as BGR, as cv2.imread would produce
+        result, _ = self.ocr(cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR))
+        
+        width, height = image.size
+        words, boxes = [], []
+        for points, line, _score in result or []:
+            xs = [x for x, _ in points]
+            ys = [y for _, y in points]
+            words.append(line)
+            # LayoutLMv3 expects boxes normalized to a 0-1000 grid
+            boxes.append([
+                min(1000, max(0, int(1000 * min(xs) / width))),
+                min(1000, max(0, int(1000 * min(ys) / height))),
+                min(1000, max(0, int(1000 * max(xs) / width))),
+                min(1000, max(0, int(1000 * max(ys) / height)))
+            ])
+        
+        return {"text": "\n".join(words), "words": words, "boxes": boxes}
+    
     def _extract_layout_features(self, image: Image.Image) -> Dict[str, Any]:
         """Extract layout features from image"""
-        # Convert to OpenCV format
-        cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        # View PIL pixels directly; convert straight from RGB without a BGR copy
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        rgb = np.asarray(image)
+        
+        # Signature/stamp heuristics don't need full resolution
+        rgb = cv2.resize(rgb, (0, 0), fx=_LAYOUT_SCALE, fy=_LAYOUT_SCALE, interpolation=cv2.INTER_AREA)
         
         # Detect signatures (simple contour detection)
-        gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
         contours, _ = cv2.findContours(gray, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
-        signature_detected = len([c for c in contours if cv2.contourArea(c) > 500]) > 0
+        signature_detected = any(cv2.contourArea(c) > _SIGNATURE_MIN_AREA for c in contours)
         
         # Detect stamps (color detection for red/blue)
-        hsv = cv2.cvtColor(cv_image, cv2.COLOR_BGR2HSV)
+        hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
         red_mask = cv2.inRange(hsv, (0, 50, 50), (10, 255, 255))
         blue_mask = cv2.inRange(hsv, (100, 50, 50), (130, 255, 255))
         
-        stamp_detected = cv2.countNonZero(red_mask) > 1000 or cv2.countNonZero(blue_mask) > 1000
+        stamp_mask = cv2.bitwise_or(red_mask, blue_mask)
+        stamp_detected = cv2.countNonZero(stamp_mask) > _STAMP_MIN_PIXELS
         
         return {
             "signature_detected": signature_detected,
@@ -88,29 +305,36 @@ class VLMProcessor:
             "image_dimensions": image.size
         }
     
-    async def _process_with_layoutlm(self, image: Image.Image, text: str) -> Dict[str, Any]:
-        """Process with LayoutLMv3 model, handling long texts by chunking to 512 tokens."""
+    async def _process_with_layoutlm(
+        self,
+        images: List[Image.Image],
+        words: List[List[str]],
+        boxes: List[List[List[int]]]
+    ) -> List[Dict[str, Any]]:
+        """Run LayoutLMv3 on all pages, on the shared server if configured, else in one in-process batch"""
+        if self._layoutlm_session is None:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.layoutlm.executor, self.layoutlm.predict_batch, images, words, boxes
+            )
+        
+        # The server batches concurrent pages itself
+        return await asyncio.gather(*(
+            self._post_to_layoutlm_server(image, page_words, page_boxes)
+            for image, page_words, page_boxes in zip(images, words, boxes)
+        ))
+    
+    async def _post_to_layoutlm_server(self, image: Image.Image, words: List[str], boxes: List[List[int]]) -> Dict[str, Any]:
+        """Send one page to the shared LayoutLMv3 server"""
         try:
-            max_length = 512
-            # Tokenize the text to count tokens
-            words = text.split()
-            chunks = [" ".join(words[i:i+max_length]) for i in range(0, len(words), max_length)]
-            all_confidences = []
-            all_token_counts = 0
-            for chunk in chunks:
-                encoding = self.processor(image, chunk, return_tensors="pt")
-                encoding = {k: v.to(self.device) for k, v in encoding.items()}
-                with torch.no_grad():
-                    outputs = self.model(**encoding)
-                predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-                all_confidences.append(predictions.mean().item())
-                all_token_counts += predictions.shape[1]
-            avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0.0
-            return {
-                "confidence_scores": avg_confidence,
-                "token_predictions": all_token_counts,
-                "chunks_processed": len(chunks)
-            }
+            page = await asyncio.get_running_loop().run_in_executor(None, encode_page, image)
+            payload = orjson.dumps({"image": page, "words": words, "boxes": boxes})
+            async with self._layoutlm_session.post(
+                "http://layoutlm/predict",
+                data=payload,
+                headers={"Content-Type": "application/json"}
+            ) as response:
+                response.raise_for_status()
+                return orjson.loads(await response.read())
         except Exception as e:
             return {"error": str(e)}
     
@@ -132,39 +356,25 @@ class VLMProcessor:
         fields = {}
 
         # Landlord and Tenant
-        match = re.search(
-            r"""between\s+([A-Za-z\s,]+),\s+herein called\s+[“"'`]?Landlord[”"'`]?,?.*?and\s+([A-Za-z\s,]+),\s+herein called\s+[“"'`]?Tenant[”"'`]?""",
-            text,
-            re.IGNORECASE | re.DOTALL
-        )
+        match = _RENT_PARTIES_RE.search(text)
         if match:
             fields['landlord'] = match.group(1).strip()
             fields['tenant'] = match.group(2).strip()
 
-        # Property Address
-        match = re.search(r'located at ([0-9A-Za-z\s,]+) under the following', text, re.IGNORECASE)
+        match = _RENT_ADDR_RE.search(text)
         if match:
             fields['property_address'] = match.group(1).strip()
 
-        # Term (duration)
-        match = re.search(r'fixed term of ([a-zA-Z0-9\s]+),', text, re.IGNORECASE)
+        match = _RENT_TERM_RE.search(text)
         if match:
             fields['term'] = match.group(1).strip()
 
-        # Rent Amount
-        match = re.search(r'sum of \$([0-9,]+) per month', text, re.IGNORECASE)
-        if match:
-            fields['rent_amount'] = f"${match.group(1).strip()}"
-
-        # Security Deposit
-        match = re.search(r'security deposit of \$([0-9,]+)', text, re.IGNORECASE)
-        if match:
-            fields['security_deposit'] = f"${match.group(1).strip()}"
-
-        # Rent Due Date
-        match = re.search(r'payable monthly in advance on the ([0-9A-Za-z]+ day) of each month', text, re.IGNORECASE)
-        if match:
-            fields['rent_due_date'] = match.group(1).strip()
+        # Remaining fields in one pass; the first occurrence of each wins
+        for match in _RENT_FIELDS_RE.finditer(text):
+            key = match.lastgroup
+            if key not in fields:
+                value = match.group(key).strip()
+                fields[key] = f"${value}" if key in _RENT_MONEY_FIELDS else value
 
         return fields
     
@@ -173,14 +383,12 @@ class VLMProcessor:
         fields = {}
         
         # Extract owner name
-        owner_pattern = r"(?:owner|proprietor)[:\s]+([A-Za-z\s]+)"
-        owner_match = re.search(owner_pattern, text, re.IGNORECASE)
+        owner_match = _TITLE_OWNER_RE.search(text)
         if owner_match:
             fields['owner'] = owner_match.group(1).strip()
         
         # Extract property details
-        property_pattern = r"(?:property|plot)[:\s]+([A-Za-z0-9\s,.-]+)"
-        property_match = re.search(property_pattern, text, re.IGNORECASE)
+        property_match = _TITLE_PROP_RE.search(text)
         if property_match:
             fields['property_details'] = property_match.group(1).strip()
         
@@ -191,14 +399,12 @@ class VLMProcessor:
         fields = {}
         
         # Extract applicant name
-        applicant_pattern = r"(?:applicant|name)[:\s]+([A-Za-z\s]+)"
-        applicant_match = re.search(applicant_pattern, text, re.IGNORECASE)
+        applicant_match = _NOC_APPLICANT_RE.search(text)
         if applicant_match:
             fields['applicant'] = applicant_match.group(1).strip()
         
         # Extract purpose
-        purpose_pattern = r"(?:purpose|reason)[:\s]+([A-Za-z\s]+)"
-        purpose_match = re.search(purpose_pattern, text, re.IGNORECASE)
+        purpose_match = _NOC_PURPOSE_RE.search(text)
         if purpose_match:
             fields['purpose'] = purpose_match.group(1).strip()
         
@@ -1,10 +1,19 @@
 import streamlit as st
+import html
+import orjson
 import requests
-import json
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
+from pathlib import Path
 from typing import Dict, Any
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+
+# App stylesheet
+CSS_PATH = Path(__file__).parent / "styles" / "custom.css"
+
+@st.cache_data
+def load_css() -> str:
+    """Read the app stylesheet once per process"""
+    return f"<style>\n{CSS_PATH.read_text()}</style>"
 
 # Page config
 st.set_page_config(
@@ -15,37 +24,7 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        color: #1f77b4;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .benefit-card {
-        background-color: #d4edda;
-        border: 1px solid #c3e6cb;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 0.5rem 0;
-    }
-    .risk-card {
-        background-color: #f8d7da;
-        border: 1px solid #f5c6cb;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 0.5rem 0;
-    }
-    .summary-card {
-        background-color: #e2e3e5;
-        border: 1px solid #d6d8db;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 1rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # Initialize session state
 if 'analysis_result' not in st.session_state:
@@ -56,43 +35,36 @@ if 'uploaded_file' not in st.session_state:
 # Backend URL
 BACKEND_URL = "http://localhost:8080"
 
+# Allowed upload formats per document type
+FORMATS_MAP = {
+    "Rent Agreement": ("pdf", "jpg", "png"),
+    "Title Deed": ("pdf", "jpg", "png"),
+    "NOC": ("pdf", "jpg", "png")
+}
+
+# Summary table rows as (label, summary key)
+RENT_FIELDS = (
+    ("Landlord", "landlord"),
+    ("Tenant", "tenant"),
+    ("Property Address", "propertyAddress"),
+    ("Term", "term"),
+    ("Rent Amount", "rentAmount")
+)
+TITLE_DEED_FIELDS = (("Owner", "owner"), ("Property Details", "propertyDetails"))
+NOC_FIELDS = (("Applicant", "applicant"), ("Purpose", "purpose"))
+PRESENCE_FIELDS = (("Signature", "signaturePresent"), ("Stamp Duty", "stampDutyDetected"))
+
+# The Field column never changes, so build it once per document type
+RENT_LABELS = [label for label, _ in RENT_FIELDS + PRESENCE_FIELDS]
+TITLE_DEED_LABELS = [label for label, _ in TITLE_DEED_FIELDS + PRESENCE_FIELDS]
+NOC_LABELS = [label for label, _ in NOC_FIELDS + PRESENCE_FIELDS]
+
 def main():
     st.markdown('<h1 class="main-header">🏠 Property Document Verifier</h1>', unsafe_allow_html=True)
     
     # Sidebar - Left Pane
     with st.sidebar:
-        st.header("📄 Document Upload")
-        
-        # Document type selection
-        document_type = st.selectbox(
-            "Select Document Type",
-            ["Rent Agreement", "Title Deed", "NOC"],
-            index=0
-        )
-        
-        # Dynamic file upload based on document type
-        file_formats = get_allowed_formats(document_type)
-        st.info(f"Supported formats: {', '.join(file_formats)}")
-        
-        uploaded_file = st.file_uploader(
-            f"Upload {document_type}",
-            type=file_formats,
-            key="document_upload"
-        )
-        
-        # Process button
-        if st.button("🔍 Analyze Document", type="primary"):
-            if uploaded_file:
-                with st.spinner("Processing document..."):
-                    result = process_document(uploaded_file, document_type)
-                    if result:
-                        st.session_state.analysis_result = result
-                        st.session_state.uploaded_file = uploaded_file
-                        st.success("Document processed successfully!")
-                    else:
-                        st.error("Failed to process document")
-            else:
-                st.warning("Please upload a document first")
+        display_upload_panel()
     
     # Main Panel - Right Pane
     if st.session_state.analysis_result:
@@ -100,37 +72,93 @@ def main():
     else:
         display_welcome_message()
 
-def get_allowed_formats(document_type: str) -> list:
+@st.fragment
+def display_upload_panel():
+    """Sidebar upload controls; their interactions rerun only this fragment"""
+    st.header("📄 Document Upload")
+    
+    # Document type selection
+    document_type = st.selectbox(
+        "Select Document Type",
+        ["Rent Agreement", "Title Deed", "NOC"],
+        index=0
+    )
+    
+    # Dynamic file upload based on document type
+    file_formats = get_allowed_formats(document_type)
+    st.info(f"Supported formats: {', '.join(file_formats)}")
+    
+    uploaded_file = st.file_uploader(
+        f"Upload {document_type}",
+        type=file_formats,
+        key="document_upload"
+    )
+    
+    # Process button
+    if st.button("🔍 Analyze Document", type="primary"):
+        if uploaded_file:
+            result = process_document(uploaded_file, document_type)
+            if result:
+                st.session_state.analysis_result = result
+                st.session_state.uploaded_file = uploaded_file
+                st.session_state.document_processed = True
+                # Results are shown outside this fragment, so rerun the whole app
+                st.rerun()
+            else:
+                st.error("Failed to process document")
+        else:
+            st.warning("Please upload a document first")
+    elif st.session_state.pop("document_processed", False):
+        st.success("Document processed successfully!")
+
+def get_allowed_formats(document_type: str) -> tuple:
     """Get allowed file formats for document type"""
-    formats_map = {
-        "Rent Agreement": ["pdf", "jpg", "png"],
-        "Title Deed": ["pdf", "jpg", "png"],
-        "NOC": ["pdf", "jpg", "png"]
-    }
-    return formats_map.get(document_type, ["pdf"])
+    return FORMATS_MAP.get(document_type, ("pdf",))
+
+@st.cache_resource
+def _session() -> requests.Session:
+    """Keep-alive HTTP session to the backend, shared across reruns"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return session
+
+# The spinner is only shown on a cache miss, i.e. while the backend is working
+@st.cache_data(show_spinner="Processing document...", max_entries=32)
+def _cached_post(file_bytes: bytes, name: str, mime: str, document_type: str) -> Dict[str, Any]:
+    """Send document to the backend; identical uploads are answered from cache"""
+    # The multipart framing is streamed; the file itself is already held in memory as bytes
+    encoder = MultipartEncoder(fields={
+        "file": (name, file_bytes, mime),
+        "document_type": document_type
+    })
+    
+    # Connect fails fast; the read timeout leaves headroom over the backend's 300 s
+    # Ollama limit for PDF rendering, OCR and batching
+    response = _session().post(
+        f"{BACKEND_URL}/upload-document",
+        data=encoder,
+        headers={"Content-Type": encoder.content_type},
+        timeout=(3, 420)
+    )
+    response.raise_for_status()
+    
+    return orjson.loads(response.content)
 
 def process_document(uploaded_file, document_type: str) -> Dict[str, Any]:
     """Process document via backend API"""
     try:
-        files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-        data = {"document_type": document_type}
-        
-        response = requests.post(
-            f"{BACKEND_URL}/upload-document",
-            files=files,
-            data=data
-        )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"API Error: {response.status_code}")
-            return None
-            
+        # Errors are raised rather than returned so failed calls are not cached
+        return _cached_post(uploaded_file.getvalue(), uploaded_file.name, uploaded_file.type, document_type)
+    
+    except requests.HTTPError as e:
+        st.error(f"API Error: {e.response.status_code}")
+        return None
+    
     except Exception as e:
         st.error(f"Connection error: {str(e)}")
         return None
 
+@st.fragment
 def display_analysis_results(result: Dict[str, Any]):
     """Display analysis results in structured format"""
     analysis = result.get('analysis', {})
@@ -164,9 +192,9 @@ def display_analysis_results(result: Dict[str, Any]):
         st.subheader("❌ Risks & Concerns")
         display_risks(risks)
     
-    # JSON Export
+    # JSON Export, serialized only when asked for
     st.header("🔧 Technical Details")
-    with st.expander("View Raw JSON"):
+    if st.toggle("View Raw JSON", value=False, key="show_raw_json"):
         st.json(result)
 
 def display_document_summary(summary: Dict[str, Any], document_type: str):
@@ -178,88 +206,87 @@ def display_document_summary(summary: Dict[str, Any], document_type: str):
     elif document_type == "NOC":
         display_noc_summary(summary)
 
+def _summary_table(summary: Dict[str, Any], fields: tuple, labels: list) -> Dict[str, list]:
+    """Build the Value column for the given text fields plus signature and stamp rows"""
+    get = summary.get
+    return {
+        "Field": labels,
+        "Value": [get(key, 'N/A') for _, key in fields]
+                 + ["✅ Present" if get(key) else "❌ Missing" for _, key in PRESENCE_FIELDS]
+    }
+
 def display_rent_agreement_summary(summary: Dict[str, Any]):
     """Display rent agreement specific summary"""
-    data = {
-        "Field": ["Landlord", "Tenant", "Property Address", "Term", "Rent Amount", "Signature", "Stamp Duty"],
-        "Value": [
-            summary.get('landlord', 'N/A'),
-            summary.get('tenant', 'N/A'),
-            summary.get('propertyAddress', 'N/A'),
-            summary.get('term', 'N/A'),
-            summary.get('rentAmount', 'N/A'),
-            "✅ Present" if summary.get('signaturePresent') else "❌ Missing",
-            "✅ Present" if summary.get('stampDutyDetected') else "❌ Missing"
-        ]
-    }
-    
-    df = pd.DataFrame(data)
-    st.table(df)
+    st.table(_summary_table(summary, RENT_FIELDS, RENT_LABELS))
 
 def display_title_deed_summary(summary: Dict[str, Any]):
     """Display title deed specific summary"""
-    data = {
-        "Field": ["Owner", "Property Details", "Signature", "Stamp Duty"],
-        "Value": [
-            summary.get('owner', 'N/A'),
-            summary.get('propertyDetails', 'N/A'),
-            "✅ Present" if summary.get('signaturePresent') else "❌ Missing",
-            "✅ Present" if summary.get('stampDutyDetected') else "❌ Missing"
-        ]
-    }
-    
-    df = pd.DataFrame(data)
-    st.table(df)
+    st.table(_summary_table(summary, TITLE_DEED_FIELDS, TITLE_DEED_LABELS))
 
 def display_noc_summary(summary: Dict[str, Any]):
     """Display NOC specific summary"""
-    data = {
-        "Field": ["Applicant", "Purpose", "Signature", "Stamp Duty"],
-        "Value": [
-            summary.get('applicant', 'N/A'),
-            summary.get('purpose', 'N/A'),
-            "✅ Present" if summary.get('signaturePresent') else "❌ Missing",
-            "✅ Present" if summary.get('stampDutyDetected') else "❌ Missing"
-        ]
-    }
-    
-    df = pd.DataFrame(data)
-    st.table(df)
+    st.table(_summary_table(summary, NOC_FIELDS, NOC_LABELS))
+
+def _go():
+    """plotly.graph_objects, imported on first use so plotly doesn't delay the first render"""
+    import plotly.graph_objects as go
+    return go
+
+def _fig(*traces, **layout):
+    """Base figure for all app charts; prefer Scattergl traces and one figure per chart group"""
+    return _go().Figure(list(traces), layout={"template": "plotly_white", **layout})
+
+def _show_chart(fig, static: bool = False):
+    """Render a figure with the app's standard chart config"""
+    st.plotly_chart(fig, use_container_width=True, config={"responsive": True, "staticPlot": static})
 
 def display_confidence_scores(analysis: Dict[str, Any]):
     """Display confidence scores with visual indicators"""
+    go = _go()
+    
     confidence = analysis.get('confidence_score', 0.0)
     completeness = analysis.get('completeness_score', 0.0)
     
-    # Confidence Score
     st.metric("Confidence Score", f"{confidence:.2%}")
-    st.progress(confidence)
-    
-    # Completeness Score
     st.metric("Completeness", f"{completeness:.1f}%")
-    st.progress(completeness / 100)
+    
+    # One figure carries both values; the browser draws the gauges
+    gauge = {"axis": {"range": [0, 100]}}
+    fig = _fig(
+        go.Indicator(
+            mode="gauge+number", value=confidence * 100, number={"suffix": "%"},
+            title={"text": "Confidence"}, gauge=gauge, domain={"row": 0, "column": 0}
+        ),
+        go.Indicator(
+            mode="gauge+number", value=completeness, number={"suffix": "%"},
+            title={"text": "Completeness"}, gauge=gauge, domain={"row": 0, "column": 1}
+        ),
+        grid={"rows": 1, "columns": 2},
+        height=250,
+        margin={"t": 40, "b": 10, "l": 30, "r": 30}
+    )
+    _show_chart(fig, static=True)
 
 def display_benefits(benefits: list):
     """Display benefits in green cards"""
     if benefits:
-        for benefit in benefits:
-            st.markdown(f"""
-            <div class="benefit-card">
-                <strong>✅ {benefit}</strong>
-            </div>
-            """, unsafe_allow_html=True)
+        # One element for all cards instead of one websocket message per card
+        cards = "".join(
+            f'<div class="benefit-card"><strong>✅ {html.escape(benefit)}</strong></div>'
+            for benefit in benefits
+        )
+        st.markdown(cards, unsafe_allow_html=True)
     else:
         st.info("No specific benefits identified")
 
 def display_risks(risks: list):
     """Display risks in red cards"""
     if risks:
-        for risk in risks:
-            st.markdown(f"""
-            <div class="risk-card">
-                <strong>❌ {risk}</strong>
-            </div>
-            """, unsafe_allow_html=True)
+        cards = "".join(
+            f'<div class="risk-card"><strong>❌ {html.escape(risk)}</strong></div>'
+            for risk in risks
+        )
+        st.markdown(cards, unsafe_allow_html=True)
     else:
         st.success("No significant risks identified")
 
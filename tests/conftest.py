@@ -0,0 +1,9 @@
+import asyncio
+import pytest
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """One event loop for the whole run so session-scoped async fixtures can be shared"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
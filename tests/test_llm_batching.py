@@ -0,0 +1,133 @@
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.llm_reasoner import LLMReasoner
+
+def start_reasoner(max_batch: int, max_wait_ms: int, batches: list = None) -> LLMReasoner:
+    """Reasoner with a running batch worker and a stubbed Ollama call, without touching the network"""
+    reasoner = LLMReasoner()
+    reasoner.max_batch = max_batch
+    reasoner.max_wait_ms = max_wait_ms
+    
+    async def generate(prompt):
+        if prompt.startswith("bad"):
+            raise ValueError(f"failed {prompt}")
+        return prompt.upper()
+    reasoner._generate = generate
+    
+    # Record the prompts of each dispatched batch
+    if batches is not None:
+        dispatch = reasoner._dispatch_batch
+        async def record(batch):
+            batches.append([prompt for prompt, _ in batch])
+            await dispatch(batch)
+        reasoner._dispatch_batch = record
+    
+    reasoner._queue = asyncio.Queue()
+    reasoner._batch_worker = asyncio.create_task(reasoner._batch_loop())
+    return reasoner
+
+class TestLLMBatching:
+
+    @pytest.mark.asyncio
+    async def test_batches_are_capped_at_max_batch(self):
+        """Concurrent prompts are split into batches of at most max_batch"""
+        batches = []
+        reasoner = start_reasoner(max_batch=4, max_wait_ms=50, batches=batches)
+        try:
+            prompts = [f"p{i}" for i in range(10)]
+            results = await asyncio.gather(*(reasoner._query_ollama(p) for p in prompts))
+        finally:
+            await reasoner.close()
+        
+        assert results == [p.upper() for p in prompts]
+        assert [len(batch) for batch in batches] == [4, 4, 2]
+    
+    @pytest.mark.asyncio
+    async def test_prompts_after_max_wait_form_a_new_batch(self):
+        """A prompt arriving after the collection window is not held for the previous batch"""
+        batches = []
+        reasoner = start_reasoner(max_batch=16, max_wait_ms=20, batches=batches)
+        try:
+            first = asyncio.create_task(reasoner._query_ollama("a"))
+            await asyncio.sleep(0.1)
+            second = await reasoner._query_ollama("b")
+            assert await first == "A"
+            assert second == "B"
+        finally:
+            await reasoner.close()
+        
+        assert batches == [["a"], ["b"]]
+    
+    @pytest.mark.asyncio
+    async def test_errors_reach_only_their_own_caller(self):
+        """A failing prompt doesn't fail the other prompts in its batch"""
+        batches = []
+        reasoner = start_reasoner(max_batch=16, max_wait_ms=50, batches=batches)
+        try:
+            results = await asyncio.gather(
+                reasoner._query_ollama("ok1"),
+                reasoner._query_ollama("bad"),
+                reasoner._query_ollama("ok2"),
+                return_exceptions=True
+            )
+        finally:
+            await reasoner.close()
+        
+        assert len(batches) == 1
+        assert results[0] == "OK1"
+        assert isinstance(results[1], ValueError)
+        assert results[2] == "OK2"
+    
+    @pytest.mark.asyncio
+    async def test_close_fails_partially_collected_prompts(self):
+        """Prompts taken into a batch that is still collecting fail when the reasoner closes"""
+        reasoner = start_reasoner(max_batch=3, max_wait_ms=10_000)
+        pending = [asyncio.create_task(reasoner._query_ollama(p)) for p in ("a", "b")]
+        await asyncio.sleep(0.05)
+        
+        await reasoner.close()
+        results = await asyncio.wait_for(asyncio.gather(*pending, return_exceptions=True), 1)
+        
+        assert [str(result) for result in results] == ["LLM reasoner closed"] * 2
+    
+    @pytest.mark.asyncio
+    async def test_close_fails_queued_prompts(self):
+        """Prompts still waiting in the queue fail when the reasoner closes"""
+        reasoner = start_reasoner(max_batch=16, max_wait_ms=20)
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in range(3)]
+        # Queued before the worker gets to run, so they are never collected
+        for i, future in enumerate(futures):
+            reasoner._queue.put_nowait((f"p{i}", future))
+        
+        await reasoner.close()
+        
+        assert reasoner._queue.empty()
+        assert [str(future.exception()) for future in futures] == ["LLM reasoner closed"] * 3
+    
+    @pytest.mark.asyncio
+    async def test_close_while_an_item_arrives(self):
+        """Closing as an item reaches the collecting worker neither hangs nor loses the item"""
+        reasoner = start_reasoner(max_batch=3, max_wait_ms=10_000)
+        first = asyncio.create_task(reasoner._query_ollama("a"))
+        await asyncio.sleep(0.05)
+        
+        # Re-cancel the worker after a second in case the first cancellation is lost
+        loop = asyncio.get_running_loop()
+        loop.call_later(1, reasoner._batch_worker.cancel)
+        
+        # Wakes the worker's pending get in the same loop iteration as close() cancels it
+        future = loop.create_future()
+        reasoner._queue.put_nowait(("b", future))
+        started = loop.time()
+        await reasoner.close()
+        assert loop.time() - started < 0.5
+        
+        results = await asyncio.gather(first, future, return_exceptions=True)
+        assert [str(result) for result in results] == ["LLM reasoner closed"] * 2
@@ -1,65 +1,115 @@
-import pytest
+import pytest_asyncio
 import asyncio
 import os
 import sys
+import orjson
 from pathlib import Path
 
-# Add app directory to path
-sys.path.append(str(Path(__file__).parent.parent / "app"))
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
 
-from vlm_processor import VLMProcessor
-from llm_reasoner import LLMReasoner
+from app.llm_reasoner import LLMReasoner
 
-class TestPropertyDocumentVerifier:
+RENT_AGREEMENT_DATA = {
+    "raw_text": """
+    RENT AGREEMENT
+    
+    This agreement is made between Mr. Ramesh Sharma (Landlord) and 
+    Mr. Vaibhav Kulkarni (Tenant) for the property located at 
+    Flat 4B, Krishna Tower, Andheri East, Mumbai.
+    
+    Term: 11 months
+    Rent Amount: Rs. 22,000 per month
+    Security Deposit: Rs. 44,000
+    
+    Signatures:
+    Landlord: [Signed]
+    Tenant: [Signed]
+    """,
+    "layout_data": {
+        "signature_detected": True,
+        "stamp_detected": True,
+        "image_dimensions": (800, 1200)
+    },
+    "extracted_fields": {
+        "landlord": "Ramesh Sharma",
+        "tenant": "Vaibhav Kulkarni",
+        "property_address": "Flat 4B, Krishna Tower, Andheri East, Mumbai",
+        "term": "11 months",
+        "rent_amount": "₹22,000"
+    }
+}
+
+TITLE_DEED_DATA = {
+    "raw_text": """
+    TITLE DEED
+    
+    Owner: John Smith
+    Property: House No. 123, ABC Street
+    
+    [Missing boundary details]
+    [Missing registration details]
+    """,
+    "layout_data": {
+        "signature_detected": False,
+        "stamp_detected": False,
+        "image_dimensions": (800, 1200)
+    },
+    "extracted_fields": {
+        "owner": "John Smith",
+        "property_details": "House No. 123, ABC Street"
+    }
+}
+
+NOC_DATA = {
+    "raw_text": """
+    NO OBJECTION CERTIFICATE
+    
+    Applicant: Sarah Johnson
+    Purpose: Construction of additional floor
+    
+    Authority: Municipal Corporation
     
-    @pytest.fixture
-    async def vlm_processor(self):
-        processor = VLMProcessor()
-        await processor.initialize()
-        return processor
+    [Signature area appears blank]
+    """,
+    "layout_data": {
+        "signature_detected": False,
+        "stamp_detected": True,
+        "image_dimensions": (800, 1200)
+    },
+    "extracted_fields": {
+        "applicant": "Sarah Johnson",
+        "purpose": "Construction of additional floor"
+    }
+}
+
+# (mock extracted data, document type) pairs analysed together in one gather
+CASES = [
+    (RENT_AGREEMENT_DATA, "Rent Agreement"),
+    (TITLE_DEED_DATA, "Title Deed"),
+    (NOC_DATA, "NOC"),
+]
+
+class TestPropertyDocumentVerifier:
     
-    @pytest.fixture
+    @pytest_asyncio.fixture(scope="session")
     async def llm_reasoner(self):
         reasoner = LLMReasoner()
         await reasoner.initialize()
-        return reasoner
+        yield reasoner
+        await reasoner.close()
     
-    @pytest.mark.asyncio
-    async def test_rent_agreement_processing(self, vlm_processor, llm_reasoner):
+    @pytest_asyncio.fixture(scope="session")
+    async def analysis_results(self, llm_reasoner):
+        """Analyse all mock documents concurrently once and key the results by document type"""
+        results = await asyncio.gather(
+            *(llm_reasoner.analyze_document(data, doc_type) for data, doc_type in CASES)
+        )
+        return {doc_type: result for (_, doc_type), result in zip(CASES, results)}
+    
+    def test_rent_agreement_processing(self, analysis_results):
         """Test complete rent agreement processing"""
-        # Mock extracted data for complete rent agreement
-        mock_data = {
-            "raw_text": """
-            RENT AGREEMENT
-            
-            This agreement is made between Mr. Ramesh Sharma (Landlord) and 
-            Mr. Vaibhav Kulkarni (Tenant) for the property located at 
-            Flat 4B, Krishna Tower, Andheri East, Mumbai.
-            
-            Term: 11 months
-            Rent Amount: Rs. 22,000 per month
-            Security Deposit: Rs. 44,000
-            
-            Signatures:
-            Landlord: [Signed]
-            Tenant: [Signed]
-            """,
-            "layout_data": {
-                "signature_detected": True,
-                "stamp_detected": True,
-                "image_dimensions": (800, 1200)
-            },
-            "extracted_fields": {
-                "landlord": "Ramesh Sharma",
-                "tenant": "Vaibhav Kulkarni",
-                "property_address": "Flat 4B, Krishna Tower, Andheri East, Mumbai",
-                "term": "11 months",
-                "rent_amount": "₹22,000"
-            }
-        }
-        
-        # Test LLM analysis
-        result = await llm_reasoner.analyze_document(mock_data, "Rent Agreement")
+        result = analysis_results["Rent Agreement"]
         
         assert result is not None
         assert "summary" in result
@@ -70,63 +120,18 @@ class TestPropertyDocumentVerifier:
         assert result["summary"]["signaturePresent"] == True
         assert result["summary"]["stampDutyDetected"] == True
     
-    @pytest.mark.asyncio
-    async def test_title_deed_incomplete(self, llm_reasoner):
+    def test_title_deed_incomplete(self, analysis_results):
         """Test title deed with missing information"""
-        mock_data = {
-            "raw_text": """
-            TITLE DEED
-            
-            Owner: John Smith
-            Property: House No. 123, ABC Street
-            
-            [Missing boundary details]
-            [Missing registration details]
-            """,
-            "layout_data": {
-                "signature_detected": False,
-                "stamp_detected": False,
-                "image_dimensions": (800, 1200)
-            },
-            "extracted_fields": {
-                "owner": "John Smith",
-                "property_details": "House No. 123, ABC Street"
-            }
-        }
-        
-        result = await llm_reasoner.analyze_document(mock_data, "Title Deed")
+        result = analysis_results["Title Deed"]
         
         assert result is not None
         assert result["summary"]["signaturePresent"] == False
         assert result["summary"]["stampDutyDetected"] == False
         assert len(result["risks"]) > 0  # Should have identified missing elements
     
-    @pytest.mark.asyncio
-    async def test_noc_signature_issues(self, llm_reasoner):
+    def test_noc_signature_issues(self, analysis_results):
         """Test NOC with signature issues"""
-        mock_data = {
-            "raw_text": """
-            NO OBJECTION CERTIFICATE
-            
-            Applicant: Sarah Johnson
-            Purpose: Construction of additional floor
-            
-            Authority: Municipal Corporation
-            
-            [Signature area appears blank]
-            """,
-            "layout_data": {
-                "signature_detected": False,
-                "stamp_detected": True,
-                "image_dimensions": (800, 1200)
-            },
-            "extracted_fields": {
-                "applicant": "Sarah Johnson",
-                "purpose": "Construction of additional floor"
-            }
-        }
-        
-        result = await llm_reasoner.analyze_document(mock_data, "NOC")
+        result = analysis_results["NOC"]
         
         assert result is not None
         assert result["summary"]["signaturePresent"] == False
@@ -216,8 +221,6 @@ if __name__ == "__main__":
     test_dir.mkdir(exist_ok=True)
     
     for filename, data in test_data.items():
-        with open(test_dir / filename, 'w') as f:
-            import json
-            json.dump(data, f, indent=2)
+        (test_dir / filename).write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
     
     print("Mock test files created successfully!")
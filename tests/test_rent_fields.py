@@ -0,0 +1,67 @@
+import pytest
+import re
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Needs the OCR/model stack importable
+vlm_processor = pytest.importorskip("app.vlm_processor")
+
+# Original one-search-per-field patterns the extraction must stay equivalent to
+ORIGINAL_PATTERNS = (
+    ("property_address", re.compile(r'located at ([0-9A-Za-z\s,]+) under the following', re.IGNORECASE)),
+    ("term", re.compile(r'fixed term of ([a-zA-Z0-9\s]+),', re.IGNORECASE)),
+    ("rent_amount", re.compile(r'sum of \$([0-9,]+) per month', re.IGNORECASE)),
+    ("security_deposit", re.compile(r'security deposit of \$([0-9,]+)', re.IGNORECASE)),
+    ("rent_due_date", re.compile(r'payable monthly in advance on the ([0-9A-Za-z]+ day) of each month', re.IGNORECASE)),
+)
+
+def extract_original(text: str) -> dict:
+    """Rent fields as extracted by the original per-field searches"""
+    fields = {}
+    for key, pattern in ORIGINAL_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            value = match.group(1).strip()
+            fields[key] = f"${value}" if key in ("rent_amount", "security_deposit") else value
+    return fields
+
+TEXTS = {
+    "complete": """
+    The premises located at 12 Main Street, Springfield under the following terms.
+    The lease is for a fixed term of twelve months, starting on signing.
+    Tenant shall pay the sum of $1,500 per month,
+    payable monthly in advance on the 1st day of each month.
+    Tenant has paid a security deposit of $3,000 to the Landlord.
+    """,
+    "missing_fields": "Tenant shall pay the sum of $900 per month and nothing else is agreed.",
+    "empty": "",
+    "repeated_labels": """
+    Rent is the sum of $1,000 per month. Later revised to the sum of $1,200 per month.
+    A security deposit of $2,000 and a second security deposit of $500.
+    """,
+    "same_line": "sum of $800 per month, security deposit of $1,600, payable monthly in advance on the 5th day of each month",
+    "address_spans_term": "located at 5 Elm St for a fixed term of six months, under the following",
+    "term_spans_due_date": "for a fixed term of 12 months payable monthly in advance on the 1st day of each month, renewable",
+    "address_spans_money": "located at 7 Oak Rd with rent the sum of under the following sum of $700 per month",
+}
+
+class TestRentAgreementFields:
+
+    @pytest.mark.parametrize("name", TEXTS)
+    def test_matches_original_per_field_searches(self, name):
+        """Combined extraction agrees with the original per-field searches"""
+        text = TEXTS[name]
+        processor = vlm_processor.VLMProcessor()
+        
+        assert processor._extract_rent_agreement_fields(text) == extract_original(text)
+    
+    def test_field_inside_address_is_kept(self):
+        """A field whose label falls inside the address span is still extracted"""
+        processor = vlm_processor.VLMProcessor()
+        fields = processor._extract_rent_agreement_fields(TEXTS["address_spans_term"])
+        
+        assert fields["term"] == "six months"
+        assert fields["property_address"] == "5 Elm St for a fixed term of six months,"